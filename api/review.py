@@ -1,14 +1,17 @@
 import os
-import json
+import re
 import time
+import string
 import hmac
 import hashlib
 import sys
+import socket
+import orjson
+import functools
+import threading
 import traceback
 from io import BytesIO
 from http.server import BaseHTTPRequestHandler
-from email.parser import BytesParser
-from email.policy import default
 
 from google import genai
 from google.genai import types
@@ -18,18 +21,18 @@ import PIL.Image
 AI_PROMPT = """
 You are a brutally honest pre-post image reviewer.
 
-LANGUAGE TONE (MANDATORY): {language_tone}
-PLATFORM (MANDATORY): {platform}
+LANGUAGE TONE (MANDATORY): $language_tone
+PLATFORM (MANDATORY): $platform
 
 You MUST:
 * Write in English alphabet only.
-* Match the vibe of {language_tone} naturally.
+* Match the vibe of $language_tone naturally.
 * Do NOT switch scripts.
 * Do NOT ignore the tone.
 * Do NOT translate word-for-word.
 * Use casual social-media style with slight regional flavor if applicable.
 
-You are reviewing this image specifically for {platform}.
+You are reviewing this image specifically for $platform.
 
 Be sharp, sarcastic, and socially aware.
 If it looks cringe, forced, try-hard, generic, or platform-inappropriate — call it out directly.
@@ -76,7 +79,7 @@ No chaos scoring.
 REVIEW RULES:
 
 * 2–3 sharp sentences.
-* Explain how people will perceive it on {platform}.
+* Explain how people will perceive it on $platform.
 * No soft disclaimers.
 * No emotional cushioning.
 * Humor and sarcasm required.
@@ -91,34 +94,282 @@ Return ONLY this JSON:
 "emojiTone": "<harsh|warning|neutral|praise>"
 }
 
-If {language_tone} is ignored, the response is incorrect.
+If $language_tone is ignored, the response is incorrect.
 If score and review mismatch, the response is incorrect.
 
 Be useful. Be funny. Be honest.
 """
 
-# --- Firebase Admin ---
-def get_db():
+# Compiled once: Template.substitute renders both placeholders in a
+# single pass, where the old chained .replace() walked the ~2 KB prompt
+# twice and allocated an intermediate copy. $-placeholders also leave
+# the literal JSON braces in the prompt alone.
+_PROMPT_TMPL = string.Template(AI_PROMPT)
+
+
+@functools.lru_cache(maxsize=64)
+def _render_prompt(platform, language_tone):
+    # The {platform} x {language} product is a handful of pairs, so each
+    # rendered prompt materializes at most once per process.
+    return _PROMPT_TMPL.substitute(platform=platform, language_tone=language_tone)
+
+# Gemini vision resizes to ~768px internally; anything larger than this
+# just burns upload bandwidth.
+_MAX_IMAGE_DIM = 1024
+
+
+def _sniff_mime(data):
+    if data[:2] == b'\xff\xd8': return 'image/jpeg'
+    if data[:8] == b'\x89PNG\r\n\x1a\n': return 'image/png'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP': return 'image/webp'
+    if data[:6] in (b'GIF87a', b'GIF89a'): return 'image/gif'
+    return None
+
+
+def _image_content(image_data):
+    """Build the image argument for generate_content.
+
+    Recognized formats within the size cap ship as raw bytes, so the
+    upload skips a full decode + re-encode round-trip through PIL. PIL
+    still opens the header (lazily, no pixel decode) to check
+    dimensions, and handles downscaling and unrecognized containers.
+    """
+    img = PIL.Image.open(BytesIO(image_data))
+    if img.width > _MAX_IMAGE_DIM or img.height > _MAX_IMAGE_DIM:
+        # draft() decodes JPEGs at a reduced DCT scale, skipping the
+        # full-resolution pixel buffer; thumbnail() finishes the job.
+        img.draft('RGB', (_MAX_IMAGE_DIM, _MAX_IMAGE_DIM))
+        img.thumbnail((_MAX_IMAGE_DIM, _MAX_IMAGE_DIM), PIL.Image.LANCZOS)
+        return img
+    mime = _sniff_mime(image_data)
+    if mime is None:
+        return img
+    return types.Part.from_bytes(data=image_data, mime_type=mime)
+
+
+# --- Gemini Client ---
+def _env_number(name, default, cast):
     try:
-        import firebase_admin
-        from firebase_admin import credentials, firestore
-        if not firebase_admin._apps:
-            service_account_json = os.environ.get("FIREBASE_SERVICE_ACCOUNT_JSON")
-            if service_account_json:
-                cred_dict = json.loads(service_account_json)
-                cred = credentials.Certificate(cred_dict)
-                firebase_admin.initialize_app(cred)
+        return cast(os.environ.get(name, default))
+    except (ValueError, TypeError):
+        return cast(default)
+
+
+# Built once at import: the client keeps its HTTP channel to the Gemini
+# backend alive across warm invocations instead of reconnecting per POST.
+_GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "")
+_GEMINI_CLIENT = genai.Client(api_key=_GEMINI_API_KEY) if _GEMINI_API_KEY else None
+_MODEL_NAME = os.environ.get("GEMINI_MODEL", "gemini-2.0-flash")
+_GEN_CONFIG = types.GenerateContentConfig(
+    temperature=_env_number("GEMINI_TEMPERATURE", "1.0", float),
+    top_k=_env_number("GEMINI_TOP_K", "70", int),
+    top_p=_env_number("GEMINI_TOP_P", "0.8", float)
+)
+
+# Strips the markdown fences the model sometimes wraps around the JSON
+# in one C-level pass instead of a chain of startswith/endswith scans.
+_FENCE_RE = re.compile(r'\A```(?:json)?\r?\n?|\r?\n?```\Z')
+
+
+def _parse_review(text):
+    return orjson.loads(_FENCE_RE.sub('', text.strip()))
+
+
+# --- Review Cache ---
+# Users retry the same image often (double-tap, refresh). Hashing the
+# upload is sub-millisecond next to a multi-second Gemini call, so a
+# short-lived cache on (image digest, platform, language) turns repeats
+# into a dict lookup.
+_CACHE_TTL = 300
+_CACHE_MAX = 128
+_REVIEW_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def _cache_key(image_data, platform, language):
+    return hashlib.sha256(image_data).digest() + platform.encode() + b'|' + language.encode()
+
+
+def _cache_get(key):
+    with _CACHE_LOCK:
+        entry = _REVIEW_CACHE.get(key)
+        if not entry:
+            return None
+        ts, data = entry
+        if time.time() - ts > _CACHE_TTL:
+            del _REVIEW_CACHE[key]
+            return None
+        return data
+
+
+def _cache_put(key, data):
+    with _CACHE_LOCK:
+        if len(_REVIEW_CACHE) >= _CACHE_MAX:
+            # Evict the oldest insertion; dicts iterate in insertion order.
+            _REVIEW_CACHE.pop(next(iter(_REVIEW_CACHE)), None)
+        _REVIEW_CACHE[key] = (time.time(), data)
+
+
+# --- Multipart Parsing ---
+_READ_CHUNK = 65536
+_NAME_RE = re.compile(rb'name="([^"]*)"')
+
+
+def _multipart_boundary(ctype):
+    for param in ctype.split(';'):
+        param = param.strip()
+        if param.startswith('boundary='):
+            return param[len('boundary='):].strip('"').encode()
+    return None
+
+
+def _parse_multipart(rfile, boundary, length):
+    """Incrementally read a multipart/form-data body off the socket.
+
+    Reads 64 KiB chunks and appends them to the part currently being
+    received, so the upload is never materialized twice the way a
+    full-body read plus BytesParser/split pass would. Returns
+    (text_fields, image_bytes).
+    """
+    delim = b'\r\n--' + boundary
+    fields = {}
+    image = None
+    # A bytearray lets chunks append and consumed prefixes drop in place,
+    # instead of reallocating an immutable bytes tail on every step.
+    buf = bytearray(b'\r\n')  # seed a CRLF so the leading boundary matches delim
+    remaining = length
+    part_name = None
+    part_buf = None
+
+    def _read_more():
+        nonlocal remaining
+        if remaining <= 0:
+            return False
+        chunk = rfile.read(min(_READ_CHUNK, remaining))
+        if not chunk:
+            remaining = 0
+            return False
+        remaining -= len(chunk)
+        buf.extend(chunk)
+        return True
+
+    def _consume(end):
+        # Copy buf[:end] into the current part without an intermediate
+        # bytes object; the view must be released before the resize.
+        with memoryview(buf) as mv:
+            part_buf.write(mv[:end])
+        del buf[:end]
+
+    while True:
+        if part_buf is None:
+            i = buf.find(delim)
+            if i == -1:
+                if not _read_more():
+                    break
+                continue
+            del buf[:i + len(delim)]
+            while len(buf) < 2:
+                if not _read_more():
+                    return fields, image
+            if buf.startswith(b'--'):  # closing boundary
+                break
+            while (hdr_end := buf.find(b'\r\n\r\n')) == -1:
+                if not _read_more():
+                    return fields, image
+            m = _NAME_RE.search(buf, 0, hdr_end)
+            part_name = m.group(1).decode(errors='replace') if m else None
+            del buf[:hdr_end + 4]
+            part_buf = BytesIO()
+        else:
+            i = buf.find(delim)
+            if i != -1:
+                _consume(i)
+                if part_name == 'image':
+                    image = part_buf.getvalue()
+                elif part_name:
+                    fields[part_name] = part_buf.getvalue().decode(errors='replace').strip()
+                part_name, part_buf = None, None
             else:
-                return None
-        return firestore.client()
-    except Exception as e:
-        print(f"Firebase Init Error: {e}", file=sys.stderr)
-        return None
+                # Keep a delimiter-sized tail in case the boundary spans chunks.
+                _consume(max(0, len(buf) - len(delim)))
+                if not _read_more():
+                    break
+    return fields, image
+
+
+# --- Firestore (REST) ---
+# firebase-admin pulls in grpcio and google-api-core, which dominate
+# cold start, for what is now a single document read. A signed REST call
+# over a pooled HTTP/2 client does the same job far lighter.
+_FIRESTORE_SCOPE = "https://www.googleapis.com/auth/datastore"
+_FS_CREDS = None
+_FS_PROJECT = None
+_FS_HTTP = None
+_FS_LOCK = threading.Lock()
+try:
+    import httpx
+    import google.auth.transport.requests
+    from google.oauth2 import service_account
+    _sa_json = os.environ.get("FIREBASE_SERVICE_ACCOUNT_JSON")
+    if _sa_json:
+        _sa_info = orjson.loads(_sa_json)
+        _FS_CREDS = service_account.Credentials.from_service_account_info(
+            _sa_info, scopes=[_FIRESTORE_SCOPE])
+        _FS_PROJECT = _sa_info.get("project_id")
+        _FS_HTTP = httpx.Client(http2=True, timeout=5)
+except Exception as e:
+    print(f"Firestore REST Init Error: {e}", file=sys.stderr)
+
+
+def _firestore_token():
+    # google-auth caches the bearer token on the credentials object and
+    # only re-signs once the ~1h expiry passes.
+    with _FS_LOCK:
+        if not _FS_CREDS.valid:
+            _FS_CREDS.refresh(google.auth.transport.requests.Request())
+        return _FS_CREDS.token
+
+
+def _maintenance_on():
+    if not _FS_HTTP or not _FS_PROJECT:
+        return False
+    try:
+        url = (f"https://firestore.googleapis.com/v1/projects/{_FS_PROJECT}"
+               "/databases/(default)/documents/admin/config")
+        resp = _FS_HTTP.get(url, headers={"Authorization": f"Bearer {_firestore_token()}"})
+        if resp.status_code != 200:
+            return False
+        fields = orjson.loads(resp.content).get("fields", {})
+        return fields.get("isMaintenance", {}).get("booleanValue", False)
+    except Exception:
+        return False
+
+
+# --- Rate Limiting (Redis) ---
+# A fixed-window INCR/EXPIRE counter is one round-trip with no
+# contention, versus the read-modify-write on one hot Firestore
+# document that forced retries under load.
+_RATE_LIMIT_PER_MINUTE = int(os.environ.get("RATE_LIMIT_PER_MINUTE", "10"))
+_RATE_LIMIT_KEY = "rl:global"
+_REDIS = None
+try:
+    import redis
+    _redis_url = os.environ.get("REDIS_URL")
+    if _redis_url:
+        _REDIS = redis.Redis(connection_pool=redis.ConnectionPool.from_url(_redis_url))
+except Exception as e:
+    print(f"Redis Init Error: {e}", file=sys.stderr)
 
 class handler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps the connection alive across requests, avoiding a
+    # TCP/TLS handshake per request.
+    protocol_version = "HTTP/1.1"
+
     def do_OPTIONS(self):
         self.send_response(200)
         self._send_cors()
+        self.send_header('Content-Length', '0')
+        self._send_connection_header(200)
         self.end_headers()
 
     def do_GET(self):
@@ -126,84 +377,65 @@ class handler(BaseHTTPRequestHandler):
 
     def do_POST(self):
         try:
-            db = get_db()
-            
             # 1. Maintenance Check
-            if db:
-                try:
-                    config = db.collection('admin').document('config').get()
-                    if config.exists and config.to_dict().get('isMaintenance', False):
-                        self._json_response({"error": "System is currently under maintenance."}, 503)
-                        return
-                except: pass
-
-            # 2. Rate Limiting Logic
-            wait_time = self._enforce_limit(db)
+            if _maintenance_on():
+                self._json_response({"error": "System is currently under maintenance."}, 503)
+                return
+
+            # 2. Rate Limiting (Redis fixed window)
+            wait_time = self._enforce_limit()
             if wait_time > 0:
-                time.sleep(wait_time)
+                # Telling the client when to retry is far cheaper than
+                # blocking a worker in time.sleep for up to a minute.
+                self._json_response(
+                    {"error": "Global AI capacity reached. Try again in 1 minute."}, 429,
+                    extra_headers={'Retry-After': str(int(wait_time) + 1)}
+                )
+                return
 
             # 3. Parse Multipart Form
             ctype = self.headers.get('Content-Type', '')
             clength = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(clength)
-            
-            # Extract boundary
-            msg_raw = f"Content-Type: {ctype}\r\n\r\n".encode() + body
-            msg = BytesParser(policy=default).parsebytes(msg_raw)
-            
-            p_img, p_plat, p_lang = None, "Other", "English"
-            if msg.is_multipart():
-                for part in msg.iter_parts():
-                    name = part.get_param('name', header='content-disposition')
-                    if name == 'image': p_img = part.get_payload(decode=True)
-                    elif name == 'platform': p_plat = part.get_payload(decode=True).decode(errors='replace').strip()
-                    elif name == 'language': p_lang = part.get_payload(decode=True).decode(errors='replace').strip()
-            
+            boundary = _multipart_boundary(ctype)
+            if not boundary:
+                self._json_response({"error": "Malformed multipart request."}, 400)
+                return
+
+            fields, p_img = _parse_multipart(self.rfile, boundary, clength)
+            p_plat = fields.get('platform') or "Other"
+            p_lang = fields.get('language') or "English"
+
             if not p_img:
                 self._json_response({"error": "No image found in request."}, 400)
                 return
 
+            cache_key = _cache_key(p_img, p_plat, p_lang)
+            cached = _cache_get(cache_key)
+            if cached is not None:
+                self._json_response(cached, 200)
+                return
+
             # 4. Gemini Execution
-            api_key = os.environ.get("GEMINI_API_KEY", "")
-            model_name = os.environ.get("GEMINI_MODEL", "gemini-2.0-flash")
-
-            # Load generation params from environment
-            try:
-                temperature = float(os.environ.get("GEMINI_TEMPERATURE", "1.0"))
-            except (ValueError, TypeError):
-                temperature = 1.0
-
-            try:
-                top_k = int(os.environ.get("GEMINI_TOP_K", "70"))
-            except (ValueError, TypeError):
-                top_k = 70
-
-            try:
-                top_p = float(os.environ.get("GEMINI_TOP_P", "0.8"))
-            except (ValueError, TypeError):
-                top_p = 0.8
-
-            client = genai.Client(api_key=api_key)
-            img = PIL.Image.open(BytesIO(p_img))
-            prompt = AI_PROMPT.replace('{platform}', p_plat).replace('{language_tone}', p_lang)
-
-            response = client.models.generate_content(
-                model=model_name,
+            if not _GEMINI_CLIENT:
+                self._json_response({"error": "Gemini not configured."}, 500)
+                return
+
+            img = _image_content(p_img)
+            prompt = _render_prompt(p_plat, p_lang)
+
+            # Clients that accept SSE get tokens as Gemini emits them;
+            # everyone else gets the buffered JSON as before.
+            if 'text/event-stream' in self.headers.get('Accept', ''):
+                self._stream_review(prompt, img, cache_key)
+                return
+
+            response = _GEMINI_CLIENT.models.generate_content(
+                model=_MODEL_NAME,
                 contents=[prompt, img],
-                config=types.GenerateContentConfig(
-                    temperature=temperature,
-                    top_k=top_k,
-                    top_p=top_p
-                )
+                config=_GEN_CONFIG
             )
-            text = response.text.strip()
-            
-            # Clean JSON
-            for fence in ["```json", "```"]:
-                if text.startswith(fence): text = text[len(fence):]
-            if text.endswith("```"): text = text[:-3]
-            
-            res_data = json.loads(text.strip())
+            res_data = _parse_review(response.text)
+            _cache_put(cache_key, res_data)
             self._json_response(res_data, 200)
 
         except Exception as e:
@@ -214,31 +446,49 @@ class handler(BaseHTTPRequestHandler):
             else:
                 self._json_response({"error": "Internal processor error. Please try again."}, 500)
 
-    def _enforce_limit(self, db):
-        if not db: return 0
+    def _stream_review(self, prompt, img, cache_key):
+        # TTFT drops to first-token: each delta is flushed as an SSE
+        # event inside an HTTP/1.1 chunk, and the parsed score/roast/fix
+        # JSON follows as a final 'result' event.
+        self.send_response(200)
+        self._send_cors()
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Connection', 'keep-alive')
+        self.end_headers()
+        try:
+            pieces = []
+            for chunk in _GEMINI_CLIENT.models.generate_content_stream(
+                    model=_MODEL_NAME, contents=[prompt, img], config=_GEN_CONFIG):
+                delta = chunk.text
+                if not delta: continue
+                pieces.append(delta)
+                self._write_chunk(b"data: " + orjson.dumps({"delta": delta}) + b"\n\n")
+            res_data = _parse_review("".join(pieces))
+            _cache_put(cache_key, res_data)
+            self._write_chunk(b"event: result\ndata: " + orjson.dumps(res_data) + b"\n\n")
+        except Exception:
+            traceback.print_exc(file=sys.stderr)
+            self._write_chunk(b"event: error\ndata: {\"error\": \"Internal processor error. Please try again.\"}\n\n")
+        self._write_chunk(b"")  # zero-length chunk terminates the response
+        self.close_connection = False
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _enforce_limit(self):
+        # Returns seconds until the window resets, or 0 if allowed.
+        if not _REDIS: return 0
         try:
-            from firebase_admin import firestore
-            ref = db.collection('admin').document('rate_limiter')
-            @firestore.transactional
-            def _txn(transaction, doc_ref):
-                snap = doc_ref.get(transaction=transaction)
-                now = time.time()
-                if not snap.exists:
-                    transaction.set(doc_ref, {'last_request_processed_timestamp': now, 'total_request_processed_in_this_minute': 1, 'update_data_at_timestamp': now})
-                    return 0
-                d = snap.to_dict()
-                last, total, update = d.get('last_request_processed_timestamp', 0), d.get('total_request_processed_in_this_minute', 0), d.get('update_data_at_timestamp', now)
-                
-                sleep = 0
-                if (now - last) < 6 and total > 10:
-                    sleep = max(0, 60 - (now - update))
-                    transaction.update(doc_ref, {'last_request_processed_timestamp': now + sleep, 'total_request_processed_in_this_minute': 1, 'update_data_at_timestamp': now + sleep})
-                else:
-                    new_total = 1 if (now - update) >= 60 else total + 1
-                    new_up = now if (now - update) >= 60 else update
-                    transaction.update(doc_ref, {'last_request_processed_timestamp': now, 'total_request_processed_in_this_minute': new_total, 'update_data_at_timestamp': new_up})
-                return sleep
-            return _txn(db.transaction(), ref)
+            n = _REDIS.incr(_RATE_LIMIT_KEY)
+            if n == 1:
+                _REDIS.expire(_RATE_LIMIT_KEY, 60)
+            if n > _RATE_LIMIT_PER_MINUTE:
+                ttl = _REDIS.ttl(_RATE_LIMIT_KEY)
+                return ttl if ttl > 0 else 60
+            return 0
         except: return 0
 
     def _send_cors(self):
@@ -246,11 +496,49 @@ class handler(BaseHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Methods', 'POST, GET, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
 
-    def _json_response(self, data, status):
-        body = json.dumps(data).encode()
+    def _send_connection_header(self, status):
+        if status < 300 and self.headers.get('Connection', '').lower() != 'close':
+            self.send_header('Connection', 'keep-alive')
+        else:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+
+    def _json_response(self, data, status, extra_headers=None):
+        body = orjson.dumps(data)
         self.send_response(status)
         self._send_cors()
         self.send_header('Content-Type', 'application/json')
         self.send_header('Content-Length', str(len(body)))
+        if extra_headers:
+            for k, v in extra_headers.items():
+                self.send_header(k, v)
+        self._send_connection_header(status)
         self.end_headers()
         self.wfile.write(body)
+
+
+# --- Self-hosted entry point ---
+# Vercel drives the handler class directly; running this module serves it
+# standalone. Threads cover the I/O-bound Gemini waits inside each
+# process, and SO_REUSEPORT lets the forked workers each bind the same
+# port so the kernel balances incoming connections across them without a
+# userspace load balancer.
+def _serve(port, workers):
+    from http.server import ThreadingHTTPServer
+
+    class _Server(ThreadingHTTPServer):
+        daemon_threads = True
+
+        def server_bind(self):
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            super().server_bind()
+
+    for _ in range(max(0, workers - 1)):
+        if os.fork() == 0:
+            break  # children fall through to serve their own socket
+    _Server(('', port), handler).serve_forever()
+
+
+if __name__ == '__main__':
+    _serve(int(os.environ.get('PORT', '8000')),
+           int(os.environ.get('WEB_CONCURRENCY', '1')))
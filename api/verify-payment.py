@@ -1,40 +1,49 @@
 import os
-import json
 import hmac
-import hashlib
+import orjson
+import binascii
 from http.server import BaseHTTPRequestHandler
 
+# Encoded once at import so the secret isn't re-encoded on every request.
+_RAZORPAY_KEY_SECRET = os.environ.get("RAZORPAY_KEY_SECRET", "").encode('utf-8')
+
 
 class handler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps the connection alive between create-order and
+    # verify-payment, avoiding a TCP/TLS handshake per request.
+    protocol_version = "HTTP/1.1"
 
     def do_OPTIONS(self):
         self.send_response(200)
         self._send_cors_headers()
+        self.send_header('Content-Length', '0')
+        self._send_connection_header(200)
         self.end_headers()
 
     def do_POST(self):
-        RAZORPAY_KEY_SECRET = os.environ.get("RAZORPAY_KEY_SECRET", "")
-        if not RAZORPAY_KEY_SECRET:
+        if not _RAZORPAY_KEY_SECRET:
             self._json_response({"status": "failed", "error": "Razorpay secret not configured."}, 500)
             return
 
         try:
             content_length = int(self.headers.get('Content-Length', 0))
             body = self.rfile.read(content_length)
-            data = json.loads(body)
+            data = orjson.loads(body)
 
             razorpay_payment_id = data.get('razorpay_payment_id')
             razorpay_order_id   = data.get('razorpay_order_id')
             razorpay_signature  = data.get('razorpay_signature')
 
-            msg = f"{razorpay_order_id}|{razorpay_payment_id}"
-            generated_signature = hmac.new(
-                RAZORPAY_KEY_SECRET.encode('utf-8'),
-                msg.encode('utf-8'),
-                hashlib.sha256
-            ).hexdigest()
+            msg = f"{razorpay_order_id}|{razorpay_payment_id}".encode('utf-8')
+            # hmac.digest skips the HMAC object wrapper and dispatches
+            # straight to OpenSSL's one-shot path (SHA-NI where available).
+            generated_signature = binascii.hexlify(
+                hmac.digest(_RAZORPAY_KEY_SECRET, msg, 'sha256')
+            )
 
-            if generated_signature == razorpay_signature:
+            # compare_digest runs in constant time; a plain == would
+            # short-circuit on the first differing byte.
+            if hmac.compare_digest(generated_signature, (razorpay_signature or "").encode('utf-8')):
                 self._json_response({"status": "verified"}, 200)
             else:
                 self._json_response({"status": "failed", "error": "Invalid signature"}, 400)
@@ -48,11 +57,19 @@ class handler(BaseHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Methods', 'POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
 
+    def _send_connection_header(self, status):
+        if status < 300 and self.headers.get('Connection', '').lower() != 'close':
+            self.send_header('Connection', 'keep-alive')
+        else:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+
     def _json_response(self, data, status=200):
-        body = json.dumps(data).encode()
+        body = orjson.dumps(data)
         self.send_response(status)
         self._send_cors_headers()
         self.send_header('Content-Type', 'application/json')
         self.send_header('Content-Length', str(len(body)))
+        self._send_connection_header(status)
         self.end_headers()
         self.wfile.write(body)